@@ -0,0 +1,67 @@
+"""Бенчмарк сэмплера процессов.
+
+Запускает N дополнительных «спящих» процессов, чтобы на хосте было 1000+
+процессов, и замеряет время одного цикла ProcessSampler.sample().
+Завершается с кодом 1, если p95 цикла превышает бюджет.
+
+    python bench_processes.py --spawn 1000 --cycles 20
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+import psutil
+
+from config_agent import AGENT_PROCESS_BUDGET_MS, AGENT_TOP_PROCESSES
+from processes import ProcessSampler
+
+
+def spawn_sleepers(count: int) -> list:
+    if sys.platform == "win32":
+        cmd = [sys.executable, "-c", "import time; time.sleep(3600)"]
+    else:
+        cmd = ["sleep", "3600"]
+    return [subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            for _ in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--spawn", type=int, default=1000, help="сколько процессов запустить дополнительно")
+    parser.add_argument("--cycles", type=int, default=20, help="количество замеряемых циклов")
+    parser.add_argument("--budget-ms", type=float, default=AGENT_PROCESS_BUDGET_MS, help="бюджет на один цикл, мс")
+    parser.add_argument("--top", type=int, default=AGENT_TOP_PROCESSES)
+    args = parser.parse_args()
+
+    sleepers = spawn_sleepers(args.spawn)
+    try:
+        sampler = ProcessSampler(top_n=args.top, budget_ms=args.budget_ms)
+        sampler.sample()  # Первый цикл заполняет кэш Process-объектов
+        durations = []
+        for _ in range(args.cycles):
+            time.sleep(0.1)
+            start = time.perf_counter()
+            table = sampler.sample()
+            durations.append((time.perf_counter() - start) * 1000)
+        count = len(psutil.pids())
+    finally:
+        for p in sleepers:
+            p.kill()
+        for p in sleepers:
+            p.wait()
+
+    durations.sort()
+    p95 = durations[max(0, int(len(durations) * 0.95) - 1)]
+    print(f"processes: {count}, table rows: {len(table)}")
+    print(f"cycle ms: median {statistics.median(durations):.1f}, p95 {p95:.1f}, max {durations[-1]:.1f}")
+    print(f"per process: {statistics.median(durations) / count * 1000:.1f} us, budget {args.budget_ms} ms")
+    if p95 > args.budget_ms:
+        print("FAIL: p95 exceeds budget")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
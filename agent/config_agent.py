@@ -23,4 +23,9 @@ LOG_FILE = LOG_DIR / "rms_agent.log"
 
 # Настройки команд
 COMMAND_TIMEOUT = int(os.getenv("COMMAND_TIMEOUT", "30"))  # таймаут для выполнения команд
-SERVICE_COMMAND_TIMEOUT = int(os.getenv("SERVICE_COMMAND_TIMEOUT", "60"))  # таймаут для команд служб 
\ No newline at end of file
+SERVICE_COMMAND_TIMEOUT = int(os.getenv("SERVICE_COMMAND_TIMEOUT", "60"))  # таймаут для команд служб 
+
+# Настройки сэмплера процессов (по умолчанию выключен)
+AGENT_PROCESS_SAMPLING = os.getenv("AGENT_PROCESS_SAMPLING", "0") == "1"  # Отправлять top процессов с пингом
+AGENT_TOP_PROCESSES = int(os.getenv("AGENT_TOP_PROCESSES", "10"))  # Размер top-N по CPU и по RSS
+AGENT_PROCESS_BUDGET_MS = float(os.getenv("AGENT_PROCESS_BUDGET_MS", "250"))  # Бюджет на цикл сэмплинга, мс (5% ядра при опросе раз в 5 секунд)
\ No newline at end of file
@@ -7,6 +7,7 @@ import platform
 import json
 import logging
 from config_agent import *
+from processes import ProcessSampler
 
 # Настройка логирования
 logging.basicConfig(
@@ -22,6 +23,9 @@ logger = logging.getLogger("rms_agent")
 # Используем URL сервера из конфигурации
 SERVER = f"{AGENT_SERVER_URL}/agent"
 
+# Сэмплер процессов включается через AGENT_PROCESS_SAMPLING=1
+sampler = ProcessSampler(AGENT_TOP_PROCESSES, AGENT_PROCESS_BUDGET_MS) if AGENT_PROCESS_SAMPLING else None
+
 def collect_info():
     try:
         info = {
@@ -34,6 +38,13 @@ def collect_info():
                 for d in psutil.disk_partitions() if d.fstype
             }
         }
+        if sampler is not None:
+            try:
+                processes = sampler.collect()
+                if processes is not None:
+                    info["processes"] = processes
+            except Exception as e:
+                logger.error(f"Error sampling processes: {e}")
         logger.debug(f"Collected system info: {info}")
         return info
     except Exception as e:
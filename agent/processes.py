@@ -0,0 +1,79 @@
+import heapq
+import logging
+import math
+import time
+from typing import Dict, List, Optional
+
+import psutil
+
+logger = logging.getLogger("rms_agent.processes")
+
+# Фиксированный набор атрибутов: psutil читает их за один проход (oneshot)
+PROCESS_ATTRS = ["pid", "name", "cpu_times", "memory_info"]
+
+
+class ProcessSampler:
+    """Сэмплер процессов для top-N по CPU и RSS.
+
+    Между циклами хранит объект Process и накопленное CPU-время по каждому
+    PID, поэтому загрузка CPU считается как разница двух замеров без
+    повторного ожидания. Если цикл занял больше бюджета, следующие циклы
+    пропускаются так, чтобы средние накладные расходы оставались в бюджете.
+    """
+
+    def __init__(self, top_n: int = 10, budget_ms: float = 250.0):
+        self.top_n = top_n
+        self.budget_ms = budget_ms
+        self.cpu_count = psutil.cpu_count() or 1
+        # pid -> (Process, суммарное CPU-время user+system)
+        self._prev: Dict[int, tuple] = {}
+        self._prev_time: Optional[float] = None
+        self._skip = 0
+        self.last_duration_ms = 0.0
+
+    def sample(self) -> List[Dict]:
+        """Снимает все процессы и возвращает top-N по CPU и по RSS"""
+        now = time.monotonic()
+        elapsed = now - self._prev_time if self._prev_time is not None else 0.0
+        current: Dict[int, tuple] = {}
+        rows = []
+        for proc in psutil.process_iter(PROCESS_ATTRS, ad_value=None):
+            info = proc.info
+            cpu_times, mem = info["cpu_times"], info["memory_info"]
+            if cpu_times is None or mem is None:
+                continue
+            total = cpu_times.user + cpu_times.system
+            pid = info["pid"]
+            cpu = 0.0
+            prev = self._prev.get(pid)
+            # process_iter возвращает тот же объект Process, пока PID не переиспользован
+            if prev is not None and prev[0] is proc and elapsed > 0:
+                # Процент от всей машины, как и общий cpu хоста
+                cpu = max(total - prev[1], 0.0) / elapsed / self.cpu_count * 100
+            current[pid] = (proc, total)
+            rows.append((cpu, mem.rss, pid, info["name"] or ""))
+        self._prev = current
+        self._prev_time = now
+
+        top = {r[2]: r for r in heapq.nlargest(self.top_n, rows)}
+        top.update((r[2], r) for r in heapq.nlargest(self.top_n, rows, key=lambda r: r[1]))
+        return [
+            {"pid": pid, "name": name, "cpu": round(cpu, 1), "rss": rss}
+            for cpu, rss, pid, name in sorted(top.values(), reverse=True)
+        ]
+
+    def collect(self) -> Optional[List[Dict]]:
+        """Сэмпл с учётом бюджета; None, если этот цикл пропускается"""
+        if self._skip > 0:
+            self._skip -= 1
+            return None
+        start = time.perf_counter()
+        table = self.sample()
+        self.last_duration_ms = (time.perf_counter() - start) * 1000
+        if self.last_duration_ms > self.budget_ms:
+            self._skip = math.ceil(self.last_duration_ms / self.budget_ms) - 1
+            logger.warning(
+                f"Process sampling took {self.last_duration_ms:.1f} ms "
+                f"(budget {self.budget_ms} ms), skipping {self._skip} cycles"
+            )
+        return table
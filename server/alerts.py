@@ -0,0 +1,359 @@
+import asyncio
+import heapq
+import json
+import logging
+import operator
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import deque
+from fnmatch import fnmatch
+from typing import Dict, List, Optional
+
+import requests
+
+logger = logging.getLogger("rms_server.alerts")
+
+ALERT_KINDS = ("metric", "service", "offline")
+ALERT_METRICS = ("cpu", "memory", "disk")
+ALERT_OPS = {">": operator.gt, ">=": operator.ge, "<": operator.lt, "<=": operator.le}
+
+
+class WebhookSink:
+    """Отправляет события алертов POST-запросом с JSON в фоновом потоке"""
+
+    def __init__(self, url: str, timeout: float = 5.0, max_queue: int = 1000):
+        self.url = url
+        self.timeout = timeout
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._worker, name="alert-webhook", daemon=True)
+        self._thread.start()
+
+    def send(self, event: Dict):
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            logger.error(f"Webhook queue is full, dropping alert event for {self.url}")
+
+    def _worker(self):
+        while True:
+            event = self._queue.get()
+            try:
+                response = requests.post(self.url, json=event, timeout=self.timeout)
+                response.raise_for_status()
+            except requests.exceptions.RequestException as e:
+                logger.error(f"Error sending alert to webhook {self.url}: {e}")
+            finally:
+                self._queue.task_done()
+
+
+class AlertEngine:
+    """Инкрементальная проверка правил алертов при каждом post_info/post_services.
+
+    Для каждого хоста хранится состояние по каждому подходящему правилу
+    (с какого момента условие выполняется, сработал ли алерт), поэтому
+    обновление стоит O(правил для хоста) без полных обходов парка. Уход
+    хоста в оффлайн отслеживается по куче дедлайнов: на хост приходится
+    одна запись, которая переносится при каждом новом пинге. Дедлайны
+    засеиваются из online_status сервера и из сохранённого списка известных
+    хостов, поэтому хост, замолчавший до перезапуска сервера или до
+    добавления правила, тоже уходит в оффлайн.
+    """
+
+    def __init__(self, rules_file: os.PathLike, offline_timeout: float,
+                 history_size: int = 1000, sinks: Optional[List] = None,
+                 online_status: Optional[Dict[str, float]] = None,
+                 save_interval: float = 5.0):
+        self.rules_file = rules_file
+        self.offline_timeout = offline_timeout
+        self.sinks = sinks or []
+        # Ссылка на online_status сервера: время последнего пинга по хостам
+        self.online_status = online_status if online_status is not None else {}
+        self.save_interval = save_interval
+        self.rules: Dict[str, Dict] = {}
+        self.active: Dict[str, Dict] = {}
+        self.history: deque = deque(maxlen=history_size)
+        # host -> rule_id -> key -> {"since", "firing", ...}
+        self._state: Dict[str, Dict[str, Dict[str, Dict]]] = {}
+        # host -> правила, подходящие под его имя (сбрасывается при изменении правил)
+        self._host_rules: Dict[str, List[Dict]] = {}
+        self._last_seen: Dict[str, float] = {}
+        self._deadlines: List = []
+        self._scheduled: set = set()
+        # Хосты, когда-либо присылавшие post_info (сохраняются вместе с правилами)
+        self._known_hosts: set = set()
+        self._hosts_dirty = False
+        self._last_save = 0.0
+        self._wakeup: Optional[asyncio.Event] = None
+
+    # 📋 Управление правилами
+
+    @staticmethod
+    def _validate(spec: Dict) -> Dict:
+        kind = spec.get("kind")
+        if kind not in ALERT_KINDS:
+            raise ValueError(f"kind must be one of {ALERT_KINDS}")
+        if not spec.get("name"):
+            raise ValueError("name is required")
+        rule = {
+            "name": spec["name"],
+            "kind": kind,
+            "selector": spec.get("selector") or "*",
+            "severity": spec.get("severity") or "warning",
+            "for_seconds": spec.get("for_seconds") or 0,
+        }
+        if kind == "metric":
+            if spec.get("metric") not in ALERT_METRICS:
+                raise ValueError(f"metric must be one of {ALERT_METRICS}")
+            if spec.get("op", ">") not in ALERT_OPS:
+                raise ValueError(f"op must be one of {tuple(ALERT_OPS)}")
+            if spec.get("threshold") is None:
+                raise ValueError("threshold is required for kind=metric")
+            rule.update(metric=spec["metric"], op=spec.get("op", ">"), threshold=spec["threshold"])
+        elif kind == "service":
+            if not spec.get("service"):
+                raise ValueError("service is required for kind=service")
+            rule.update(service=spec["service"], expected=(spec.get("expected") or "RUNNING").upper())
+        return rule
+
+    def add_rule(self, spec: Dict) -> Dict:
+        rule = self._validate(spec)
+        rule["id"] = uuid.uuid4().hex[:12]
+        self.rules[rule["id"]] = rule
+        self._host_rules.clear()
+        self.save()
+        if rule["kind"] == "offline":
+            # Хосты, уже замолчавшие к моменту добавления правила, проверяем сразу
+            self._seed(time.time())
+        logger.info(f"Added alert rule {rule['id']}: {rule['name']}")
+        return rule
+
+    def remove_rule(self, rule_id: str) -> bool:
+        if self.rules.pop(rule_id, None) is None:
+            return False
+        self._host_rules.clear()
+        now = time.time()
+        for host, per_rule in self._state.items():
+            for key, st in per_rule.pop(rule_id, {}).items():
+                if st["firing"]:
+                    self._resolve(rule_id, host, key, now)
+        self.save()
+        logger.info(f"Removed alert rule {rule_id}")
+        return True
+
+    def save(self):
+        tmp = f"{self.rules_file}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(
+                {"rules": list(self.rules.values()), "hosts": sorted(self._known_hosts)},
+                f, ensure_ascii=False, indent=2
+            )
+        os.replace(tmp, self.rules_file)
+        self._hosts_dirty = False
+        self._last_save = time.time()
+
+    def load(self):
+        if os.path.exists(self.rules_file):
+            try:
+                with open(self.rules_file, encoding="utf-8") as f:
+                    data = json.load(f)
+                rules = data.get("rules", [])
+                self.rules = {r["id"]: r for r in rules}
+                self._known_hosts.update(data.get("hosts", []))
+                self._host_rules.clear()
+                logger.info(f"Loaded {len(rules)} alert rules and {len(self._known_hosts)} known hosts")
+            except (OSError, ValueError) as e:
+                logger.error(f"Error loading alert rules from {self.rules_file}: {e}")
+        self._seed(time.time())
+
+    def _rules_for(self, host: str, kind: str) -> List[Dict]:
+        rules = self._host_rules.get(host)
+        if rules is None:
+            rules = [r for r in self.rules.values() if fnmatch(host, r["selector"])]
+            self._host_rules[host] = rules
+        return [r for r in rules if r["kind"] == kind]
+
+    # 🚨 Срабатывание и снятие алертов
+
+    def _emit(self, event: Dict):
+        self.history.append(event)
+        for sink in self.sinks:
+            sink.send(event)
+
+    def _fire(self, rule: Dict, host: str, key: str, value, since: float, now: float, message: str):
+        alert = {
+            "id": f"{rule['id']}:{host}:{key}",
+            "rule_id": rule["id"],
+            "rule": rule["name"],
+            "severity": rule["severity"],
+            "host": host,
+            "key": key,
+            "value": value,
+            "since": since,
+            "fired_at": now,
+            "message": message,
+        }
+        self.active[alert["id"]] = alert
+        self._emit({**alert, "state": "firing", "time": now})
+        logger.warning(f"Alert firing: {message}")
+
+    def _resolve(self, rule_id: str, host: str, key: str, now: float):
+        alert = self.active.pop(f"{rule_id}:{host}:{key}", None)
+        if alert is not None:
+            self._emit({**alert, "state": "resolved", "time": now})
+            logger.info(f"Alert resolved: {alert['message']}")
+
+    def _check(self, rule: Dict, host: str, key: str, bad: bool, value, now: float, message: str,
+               since: Optional[float] = None):
+        """Обновляет состояние (правило, хост, ключ) по одному наблюдению"""
+        per_key = self._state.setdefault(host, {}).setdefault(rule["id"], {})
+        st = per_key.get(key)
+        if not bad:
+            if st is not None:
+                if st["firing"]:
+                    self._resolve(rule["id"], host, key, now)
+                del per_key[key]
+            return
+        if st is None:
+            st = per_key[key] = {"since": now if since is None else since, "firing": False}
+        if not st["firing"] and now - st["since"] >= rule["for_seconds"]:
+            st["firing"] = True
+            self._fire(rule, host, key, value, st["since"], now, message)
+
+    # 📥 Входящие данные от агентов
+
+    def on_info(self, host: str, cpu: float, memory: float, disks: Dict[str, float], now: Optional[float] = None):
+        now = time.time() if now is None else now
+        self._touch(host, now)
+        for rule in self._rules_for(host, "metric"):
+            cmp = ALERT_OPS[rule["op"]]
+            if rule["metric"] == "disk":
+                values = disks
+                # Пропавшие диски больше не наблюдаются - снимаем по ним состояние
+                per_key = self._state.get(host, {}).get(rule["id"], {})
+                for key in [k for k in per_key if k not in disks]:
+                    self._check(rule, host, key, False, None, now, "")
+            else:
+                values = {rule["metric"]: cpu if rule["metric"] == "cpu" else memory}
+            for key, value in values.items():
+                self._check(
+                    rule, host, key, cmp(value, rule["threshold"]), value, now,
+                    f"{rule['name']}: {host} {key} = {value} {rule['op']} {rule['threshold']}"
+                )
+
+    def on_services(self, host: str, services: List[Dict], now: Optional[float] = None):
+        """Служба, бывшая в ожидаемом состоянии, вышла из него"""
+        now = time.time() if now is None else now
+        for rule in self._rules_for(host, "service"):
+            per_key = self._state.setdefault(host, {}).setdefault(rule["id"], {})
+            names = {
+                svc.get("name", "") for svc in services
+                if fnmatch(svc.get("name", "").lower(), rule["service"].lower())
+            }
+            # Пропавшие из списка службы больше не наблюдаются - снимаем по ним состояние
+            for key in [k for k in per_key if k.split("seen:", 1)[-1] not in names]:
+                self._check(rule, host, key, False, None, now, "")
+            for svc in services:
+                name = svc.get("name", "")
+                if name not in names:
+                    continue
+                status = str(svc.get("status", "")).upper()
+                ok = status == rule["expected"]
+                # Ключ "seen" отмечает, что служба была в ожидаемом состоянии
+                seen_key = f"seen:{name}"
+                if ok:
+                    per_key[seen_key] = {"since": now, "firing": False}
+                elif seen_key not in per_key:
+                    continue
+                self._check(
+                    rule, host, name, not ok, status, now,
+                    f"{rule['name']}: {host} service {name} is {status}, expected {rule['expected']}"
+                )
+
+    # ⏱️ Отслеживание оффлайна
+
+    def _track(self, host: str, seen: float):
+        """Запоминает последний пинг хоста и ставит ему дедлайн, если его ещё нет"""
+        self._last_seen[host] = max(self._last_seen.get(host, 0.0), seen)
+        if host not in self._scheduled:
+            self._scheduled.add(host)
+            self._push(self._last_seen[host] + self.offline_timeout, host, "deadline")
+
+    def _seed(self, now: float):
+        """Ставит дедлайны всем известным хостам, включая уже замолчавшие.
+
+        Для хостов из сохранённого списка, которых нет в online_status (после
+        перезапуска сервера), отсчёт идёт от момента засева.
+        """
+        for host in self._known_hosts | set(self.online_status):
+            seen = self.online_status.get(host) or self._last_seen.get(host) or now
+            self._known_hosts.add(host)
+            self._track(host, seen)
+
+    def _touch(self, host: str, now: float):
+        for rule in self._rules_for(host, "offline"):
+            self._check(rule, host, "offline", False, None, now, "")
+        self._track(host, now)
+        if host not in self._known_hosts:
+            self._known_hosts.add(host)
+            self._hosts_dirty = True
+        # Новые хосты сохраняем не чаще раза в save_interval
+        if self._hosts_dirty and now - self._last_save >= self.save_interval:
+            self.save()
+
+    def _push(self, when: float, host: str, kind: str):
+        heapq.heappush(self._deadlines, (when, host, kind))
+        if self._wakeup is not None and self._deadlines[0][0] == when:
+            self._wakeup.set()
+
+    def _check_offline(self, host: str, now: float):
+        offline_since = self._last_seen[host] + self.offline_timeout
+        for rule in self._rules_for(host, "offline"):
+            self._check(
+                rule, host, "offline", True, self._last_seen[host], now,
+                f"{rule['name']}: {host} is offline since {time.ctime(self._last_seen[host])}",
+                since=offline_since
+            )
+            # Для правила с задержкой проверяем хост ещё раз по её истечении
+            if offline_since + rule["for_seconds"] > now:
+                self._push(offline_since + rule["for_seconds"], host, "grace")
+
+    def _run_due(self):
+        now = time.time()
+        while self._deadlines and self._deadlines[0][0] <= now:
+            _, host, kind = heapq.heappop(self._deadlines)
+            deadline = self._last_seen[host] + self.offline_timeout
+            if kind == "grace":
+                if deadline <= now:
+                    self._check_offline(host, now)
+                continue
+            if deadline > now:
+                # Хост пинговал после постановки дедлайна - переносим запись
+                heapq.heappush(self._deadlines, (deadline, host, kind))
+                continue
+            self._scheduled.discard(host)
+            # Данные замолчавшего хоста устарели - снимаем его метрические и сервисные алерты
+            for rule_id, per_key in self._state.get(host, {}).items():
+                rule = self.rules.get(rule_id)
+                if rule is not None and rule["kind"] != "offline":
+                    for key in list(per_key):
+                        self._check(rule, host, key, False, None, now, "")
+            self._check_offline(host, now)
+        if self._hosts_dirty and now - self._last_save >= self.save_interval:
+            self.save()
+
+    async def run(self):
+        self._wakeup = asyncio.Event()
+        while True:
+            try:
+                self._run_due()
+            except Exception as e:
+                logger.error(f"Error in alerts loop: {e}")
+            timeout = self._deadlines[0][0] - time.time() if self._deadlines else None
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
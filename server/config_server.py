@@ -27,4 +27,23 @@ CORS_ORIGINS = [
 # Настройки безопасности
 MAX_RESULTS_PER_HOST = int(os.getenv("MAX_RESULTS_PER_HOST", "100"))  # Максимальное количество результатов на хост
 MAX_TASKS_PER_HOST = int(os.getenv("MAX_TASKS_PER_HOST", "10"))  # Максимальное количество задач в очереди
-AGENT_TIMEOUT = int(os.getenv("AGENT_TIMEOUT", "30"))  # секунды до отметки агента как оффлайн 
\ No newline at end of file
+AGENT_TIMEOUT = int(os.getenv("AGENT_TIMEOUT", "30"))  # секунды до отметки агента как оффлайн 
+
+# Настройки статистики парка
+FLEET_TOP_N = int(os.getenv("FLEET_TOP_N", "10"))  # Количество хостов в top-N по умолчанию
+FLEET_DISK_THRESHOLD = float(os.getenv("FLEET_DISK_THRESHOLD", "90"))  # Порог заполненности диска, %
+
+# Настройки планировщика
+SCHEDULER_STATE_FILE = Path(os.getenv("SCHEDULER_STATE_FILE", BASE_DIR / "scheduler_state.json"))  # Файл с сохранёнными заданиями
+SCHEDULER_HOSTS_PER_SECOND = float(os.getenv("SCHEDULER_HOSTS_PER_SECOND", "100"))  # Скорость рассылки задания по хостам
+SCHEDULER_MAX_SPREAD = float(os.getenv("SCHEDULER_MAX_SPREAD", "300"))  # Максимальное окно растягивания рассылки, секунды
+
+# Настройки алертов
+ALERT_RULES_FILE = Path(os.getenv("ALERT_RULES_FILE", BASE_DIR / "alert_rules.json"))  # Файл с правилами алертов и списком известных хостов
+ALERT_HISTORY_SIZE = int(os.getenv("ALERT_HISTORY_SIZE", "1000"))  # Количество событий в истории алертов
+ALERT_WEBHOOK_URLS = [u.strip() for u in os.getenv("ALERT_WEBHOOK_URLS", "").split(",") if u.strip()]  # Webhook-получатели через запятую
+ALERT_WEBHOOK_TIMEOUT = float(os.getenv("ALERT_WEBHOOK_TIMEOUT", "5"))  # Таймаут отправки webhook, секунды
+
+# Настройки хранения выводов команд
+OUTPUT_COMPRESS_MIN_SIZE = int(os.getenv("OUTPUT_COMPRESS_MIN_SIZE", "256"))  # Выводы от этого размера (байт) сжимаются
+OUTPUT_COMPRESS_LEVEL = int(os.getenv("OUTPUT_COMPRESS_LEVEL", "6"))  # Уровень сжатия zlib
\ No newline at end of file
@@ -0,0 +1,162 @@
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# Квантили, которые отдаём в статистике парка
+FLEET_PERCENTILES = (50, 75, 90, 95, 99)
+
+
+class FleetStore:
+    """Колоночное (NumPy) зеркало последних ClientInfo по всем хостам.
+
+    Каждый хост занимает строку в массивах cpu/memory/last_seen, каждый диск -
+    слот в плоской таблице дисков. post_info обновляет значения на месте,
+    поэтому статистика по всему парку считается векторно, без обхода словарей.
+    """
+
+    def __init__(self, capacity: int = 1024, disk_capacity: int = 4096):
+        self.host_rows: Dict[str, int] = {}
+        self.hostnames: List[str] = []
+        self.cpu = np.full(capacity, np.nan)
+        self.memory = np.full(capacity, np.nan)
+        self.last_seen = np.zeros(capacity)
+
+        # Плоская таблица дисков: строка хоста, точка монтирования, заполненность
+        self.disk_slots: Dict[str, Dict[str, int]] = {}
+        self.disk_mounts: List[str] = []
+        self.disk_free: List[int] = []
+        self.disk_host = np.full(disk_capacity, -1, dtype=np.int64)
+        self.disk_usage = np.full(disk_capacity, np.nan)
+
+    @staticmethod
+    def _grow(arr: np.ndarray, size: int, fill) -> np.ndarray:
+        """Увеличивает массив вдвое (или до size), заполняя хвост значением fill"""
+        new = np.full(max(size, len(arr) * 2), fill, dtype=arr.dtype)
+        new[:len(arr)] = arr
+        return new
+
+    def _host_row(self, hostname: str) -> int:
+        row = self.host_rows.get(hostname)
+        if row is None:
+            row = len(self.hostnames)
+            if row >= len(self.cpu):
+                self.cpu = self._grow(self.cpu, row + 1, np.nan)
+                self.memory = self._grow(self.memory, row + 1, np.nan)
+                self.last_seen = self._grow(self.last_seen, row + 1, 0.0)
+            self.host_rows[hostname] = row
+            self.hostnames.append(hostname)
+            self.disk_slots[hostname] = {}
+        return row
+
+    def _disk_slot(self, row: int, hostname: str, mount: str) -> int:
+        slots = self.disk_slots[hostname]
+        slot = slots.get(mount)
+        if slot is None:
+            if self.disk_free:
+                slot = self.disk_free.pop()
+                self.disk_mounts[slot] = mount
+            else:
+                slot = len(self.disk_mounts)
+                if slot >= len(self.disk_usage):
+                    self.disk_host = self._grow(self.disk_host, slot + 1, -1)
+                    self.disk_usage = self._grow(self.disk_usage, slot + 1, np.nan)
+                self.disk_mounts.append(mount)
+            self.disk_host[slot] = row
+            slots[mount] = slot
+        return slot
+
+    def update(self, hostname: str, cpu: float, memory: float,
+               disks: Dict[str, float], seen: Optional[float] = None):
+        """Обновляет строку хоста последними значениями из post_info"""
+        row = self._host_row(hostname)
+        self.cpu[row] = cpu
+        self.memory[row] = memory
+        self.last_seen[row] = time.time() if seen is None else seen
+
+        slots = self.disk_slots[hostname]
+        # Диски, которые пропали у хоста, освобождаем для повторного использования
+        for mount in [m for m in slots if m not in disks]:
+            slot = slots.pop(mount)
+            self.disk_host[slot] = -1
+            self.disk_usage[slot] = np.nan
+            self.disk_free.append(slot)
+        for mount, usage in disks.items():
+            slot = self._disk_slot(row, hostname, mount)
+            self.disk_usage[slot] = usage
+
+    def _host_mask(self, online_within: Optional[float]) -> np.ndarray:
+        n = len(self.hostnames)
+        if online_within is None:
+            return np.ones(n, dtype=bool)
+        return time.time() - self.last_seen[:n] < online_within
+
+    @staticmethod
+    def _summary(values: np.ndarray, bins: int) -> Dict:
+        values = values[~np.isnan(values)]
+        if values.size == 0:
+            return {"count": 0, "mean": None, "max": None, "percentiles": {}, "histogram": None}
+        counts, edges = np.histogram(values, bins=bins, range=(0.0, 100.0))
+        pcts = np.percentile(values, FLEET_PERCENTILES)
+        return {
+            "count": int(values.size),
+            "mean": float(values.mean()),
+            "max": float(values.max()),
+            "percentiles": {f"p{p}": float(v) for p, v in zip(FLEET_PERCENTILES, pcts)},
+            "histogram": {"counts": counts.tolist(), "edges": edges.tolist()},
+        }
+
+    def _top(self, column: np.ndarray, rows: np.ndarray, top_n: int) -> List[Dict]:
+        values = column[rows]
+        valid = ~np.isnan(values)
+        rows, values = rows[valid], values[valid]
+        k = min(top_n, values.size)
+        if k <= 0:
+            return []
+        # argpartition - O(n), сортируем только выбранные k элементов
+        idx = np.argpartition(values, values.size - k)[-k:]
+        idx = idx[np.argsort(values[idx])[::-1]]
+        return [{"host": self.hostnames[rows[i]], "value": float(values[i])} for i in idx]
+
+    def stats(self, top_n: int = 10, disk_threshold: float = 90.0,
+              bins: int = 10, online_within: Optional[float] = None) -> Dict:
+        """Квантили, гистограммы, top-N хостов и диски выше порога по всему парку"""
+        n = len(self.hostnames)
+        mask = self._host_mask(online_within)
+        rows = np.flatnonzero(mask)
+
+        used = len(self.disk_mounts)
+        disk_host = self.disk_host[:used]
+        disk_usage = self.disk_usage[:used]
+        disk_sel = disk_host >= 0
+        disk_sel[disk_sel] = mask[disk_host[disk_sel]]
+        disk_values = disk_usage[disk_sel]
+
+        # Максимальная заполненность диска по каждому хосту
+        host_disk_max = np.full(n, np.nan)
+        if disk_values.size:
+            host_disk_max[:] = -np.inf
+            np.maximum.at(host_disk_max, disk_host[disk_sel], disk_values)
+            host_disk_max[np.isneginf(host_disk_max)] = np.nan
+
+        over = np.flatnonzero(disk_sel & (disk_usage > disk_threshold))
+        over = over[np.argsort(disk_usage[over])[::-1]]
+
+        return {
+            "hosts": int(rows.size),
+            "cpu": self._summary(self.cpu[rows], bins),
+            "memory": self._summary(self.memory[rows], bins),
+            "disk": self._summary(disk_values, bins),
+            "top_cpu": self._top(self.cpu, rows, top_n),
+            "top_memory": self._top(self.memory, rows, top_n),
+            "top_disk": self._top(host_disk_max, rows, top_n),
+            "disk_threshold": disk_threshold,
+            "disks_over_threshold": [
+                {
+                    "host": self.hostnames[self.disk_host[s]],
+                    "disk": self.disk_mounts[s],
+                    "usage": float(self.disk_usage[s]),
+                }
+                for s in over
+            ],
+        }
@@ -1,10 +1,16 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import Dict, List
-import uvicorn, time
+from typing import Awaitable, Callable, Dict, List, Optional
+from fnmatch import fnmatch
+from contextlib import asynccontextmanager
+import uvicorn, time, asyncio
 import logging
 from config_server import *
+from fleet import FleetStore
+from scheduler import Scheduler
+from alerts import AlertEngine, WebhookSink
+from output_store import OutputStore
 
 # Настройка логирования
 logging.basicConfig(
@@ -17,7 +23,35 @@ logging.basicConfig(
 )
 logger = logging.getLogger("rms_server")
 
-app = FastAPI(title="RMS Server", version="1.0.0")
+# Фоновые циклы сервера (планировщик, алерты): держим ссылки на задачи
+background_tasks: Dict[str, asyncio.Task] = {}
+
+async def supervise(name: str, loop: Callable[[], Awaitable[None]]):
+    """Запускает фоновый цикл и перезапускает его, если он упал"""
+    while True:
+        try:
+            await loop()
+            logger.error(f"Background loop {name} exited, restarting")
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception(f"Background loop {name} crashed, restarting")
+        await asyncio.sleep(1)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    scheduler.load()
+    background_tasks["scheduler"] = asyncio.create_task(supervise("scheduler", scheduler.run))
+    alerts.load()
+    background_tasks["alerts"] = asyncio.create_task(supervise("alerts", alerts.run))
+    yield
+    for task in background_tasks.values():
+        task.cancel()
+    alerts.save()  # Сохраняем список известных хостов
+    await asyncio.gather(*background_tasks.values(), return_exceptions=True)
+    background_tasks.clear()
+
+app = FastAPI(title="RMS Server", version="1.0.0", lifespan=lifespan)
 
 # Разрешаем кросс-доменные запросы
 app.add_middleware(
@@ -36,15 +70,24 @@ clients_info: Dict[str, Dict] = {}
 # Очередь команд для каждого клиента
 tasks: Dict[str, List[str]] = {}
 
-# История выполнения команд (результаты)
+# История выполнения команд (результаты: host, cmd, result_hash)
 results: Dict[str, List[Dict]] = {}
 
+# Тела выводов команд, по одному экземпляру на уникальное содержимое
+outputs = OutputStore(OUTPUT_COMPRESS_MIN_SIZE, OUTPUT_COMPRESS_LEVEL)
+
 # Временные метки последнего пинга от клиента (для определения "онлайн/оффлайн")
 online_status: Dict[str, float] = {}
 
 # Состояние служб по каждому клиенту (список словарей: name, status, display)
 service_states: Dict[str, List[Dict]] = {}
 
+# Последняя таблица top-процессов по каждому клиенту (если агент её присылает)
+process_tables: Dict[str, Dict] = {}
+
+# Колоночное зеркало последних ClientInfo для статистики по всему парку
+fleet = FleetStore()
+
 # 🧱 Pydantic-модели для API
 
 class ClientInfo(BaseModel):
@@ -53,6 +96,7 @@ class ClientInfo(BaseModel):
     cpu: float
     memory: float
     disks: Dict[str, float]
+    processes: Optional[List[Dict]] = None  # top-N процессов по CPU/RSS (pid, name, cpu, rss)
 
 class Result(BaseModel):
     host: str
@@ -63,9 +107,35 @@ class Command(BaseModel):
     host: str
     cmd: str
 
+class Schedule(BaseModel):
+    cmd: str
+    kind: str  # interval | cron | once
+    hosts: List[str] = []
+    selector: Optional[str] = None  # Шаблон имён хостов, например "srv-*" или "*"
+    online_only: bool = True  # Для selector: только хосты в сети на момент запуска
+    every: Optional[float] = None  # interval: период в секундах
+    cron: Optional[str] = None  # cron: "мин час день месяц день_недели"
+    run_at: Optional[float] = None  # once: unix-время запуска
+    delay: Optional[float] = None  # once: задержка в секундах
+    spread: Optional[float] = None  # Окно растягивания рассылки, секунды
+
+class AlertRule(BaseModel):
+    name: str
+    kind: str  # metric | service | offline
+    selector: str = "*"  # Шаблон имён хостов
+    severity: str = "warning"
+    for_seconds: float = 0  # Сколько условие должно держаться до срабатывания
+    metric: Optional[str] = None  # metric: cpu | memory | disk
+    op: str = ">"  # metric: >, >=, <, <=
+    threshold: Optional[float] = None  # metric: порог, %
+    service: Optional[str] = None  # service: шаблон имени службы
+    expected: str = "RUNNING"  # service: ожидаемое состояние
+
 def limit_results(host: str):
     """Ограничивает количество результатов для хоста"""
     if host in results and len(results[host]) > MAX_RESULTS_PER_HOST:
+        for record in results[host][:-MAX_RESULTS_PER_HOST]:
+            outputs.release(record["result_hash"])
         results[host] = results[host][-MAX_RESULTS_PER_HOST:]
 
 def limit_tasks(host: str):
@@ -73,12 +143,55 @@ def limit_tasks(host: str):
     if host in tasks and len(tasks[host]) > MAX_TASKS_PER_HOST:
         tasks[host] = tasks[host][-MAX_TASKS_PER_HOST:]
 
+def enqueue_task(host: str, cmd: str):
+    """Ставит команду в очередь хоста"""
+    if host not in tasks:
+        tasks[host] = []
+    tasks[host].append(cmd)
+    limit_tasks(host)  # Ограничиваем количество задач
+
+def resolve_hosts(job: Dict) -> List[str]:
+    """Разворачивает hosts/selector задания в список хостов"""
+    hosts = list(dict.fromkeys(job["hosts"]))
+    if job.get("selector"):
+        current_time = time.time()
+        seen = set(hosts)
+        for k in sorted(clients_info):
+            if k in seen or not fnmatch(k, job["selector"]):
+                continue
+            if job["online_only"] and current_time - online_status.get(k, 0) >= AGENT_TIMEOUT:
+                continue
+            hosts.append(k)
+    return hosts
+
+# Планировщик повторяющихся и отложенных задач
+scheduler = Scheduler(
+    enqueue_task,
+    resolve_hosts,
+    SCHEDULER_STATE_FILE,
+    hosts_per_second=SCHEDULER_HOSTS_PER_SECOND,
+    max_spread=SCHEDULER_MAX_SPREAD
+)
+
+# Правила алертов, проверяемые при каждом post_info/post_services
+alerts = AlertEngine(
+    ALERT_RULES_FILE,
+    offline_timeout=AGENT_TIMEOUT,
+    history_size=ALERT_HISTORY_SIZE,
+    online_status=online_status,
+    sinks=[WebhookSink(url, timeout=ALERT_WEBHOOK_TIMEOUT) for url in ALERT_WEBHOOK_URLS]
+)
+
 # ✅ Получение информации от агента
 @app.post("/agent/post_info")
 async def post_info(info: ClientInfo):
     try:
-        clients_info[info.hostname] = info.model_dump()
+        clients_info[info.hostname] = info.model_dump(exclude={"processes"})
         online_status[info.hostname] = time.time()
+        if info.processes is not None:
+            process_tables[info.hostname] = {"time": online_status[info.hostname], "processes": info.processes}
+        fleet.update(info.hostname, info.cpu, info.memory, info.disks, online_status[info.hostname])
+        alerts.on_info(info.hostname, info.cpu, info.memory, info.disks, online_status[info.hostname])
         logger.info(f"Received info from {info.hostname}")
         return {"status": "ok"}
     except Exception as e:
@@ -90,6 +203,7 @@ async def post_info(info: ClientInfo):
 async def post_services(hostname: str, data: List[Dict]):
     try:
         service_states[hostname.lower()] = data
+        alerts.on_services(hostname, data)
         logger.info(f"Updated services for {hostname}")
         return {"status": "services updated"}
     except Exception as e:
@@ -114,7 +228,11 @@ async def post_result(res: Result):
     try:
         if res.host not in results:
             results[res.host] = []
-        results[res.host].append(res.model_dump())
+        results[res.host].append({
+            "host": res.host,
+            "cmd": res.cmd,
+            "result_hash": outputs.put(res.result)
+        })
         limit_results(res.host)  # Ограничиваем количество результатов
         logger.info(f"Received result from {res.host} for command: {res.cmd[:50]}...")
         return {"status": "received"}
@@ -139,33 +257,215 @@ async def get_clients():
         logger.error(f"Error getting clients list: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# ✅ Последняя таблица top-процессов хоста
+@app.get("/ui/get_processes/{hostname}")
+async def get_processes(hostname: str):
+    try:
+        return process_tables.get(hostname, {"time": None, "processes": []})
+    except Exception as e:
+        logger.error(f"Error getting processes for {hostname}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+# ✅ Статистика по всему парку: квантили, гистограммы, top-N, заполненные диски
+@app.get("/ui/fleet_stats")
+async def fleet_stats(top: int = FLEET_TOP_N, disk_threshold: float = FLEET_DISK_THRESHOLD,
+                      bins: int = 10, online_only: bool = False):
+    try:
+        if top < 0 or bins < 1:
+            raise HTTPException(status_code=400, detail="top must be >= 0 and bins >= 1")
+        return fleet.stats(
+            top_n=top,
+            disk_threshold=disk_threshold,
+            bins=bins,
+            online_within=AGENT_TIMEOUT if online_only else None
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error computing fleet stats: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 # ✅ Получение истории выполнения команд (для UI)
 @app.get("/ui/get_results/{hostname}")
 async def get_results(hostname: str):
     try:
-        return results.get(hostname, [])
+        return [
+            {**record, "result": outputs.get(record["result_hash"])}
+            for record in results.get(hostname, [])
+        ]
     except Exception as e:
         logger.error(f"Error getting results for {hostname}: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# ✅ Группировка одинаковых выводов по хостам (без распаковки тел)
+@app.get("/ui/get_result_groups")
+async def get_result_groups(cmd: Optional[str] = None):
+    try:
+        groups: Dict[str, Dict] = {}
+        for host, records in results.items():
+            for record in records:
+                if cmd is not None and record["cmd"] != cmd:
+                    continue
+                group = groups.setdefault(record["result_hash"], {
+                    "result_hash": record["result_hash"],
+                    "size": outputs.sizes[record["result_hash"]],
+                    "cmds": {},
+                    "hosts": {}
+                })
+                # dict вместо set - сохраняем порядок появления
+                group["cmds"][record["cmd"]] = None
+                group["hosts"][host] = None
+        return sorted(
+            ({**g, "cmds": list(g["cmds"]), "hosts": list(g["hosts"])} for g in groups.values()),
+            key=lambda g: len(g["hosts"]),
+            reverse=True
+        )
+    except Exception as e:
+        logger.error(f"Error grouping results: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+# ✅ Тело вывода по хешу
+@app.get("/ui/get_output/{result_hash}")
+async def get_output(result_hash: str):
+    try:
+        if result_hash not in outputs.blobs:
+            raise HTTPException(status_code=404, detail=f"Output {result_hash} not found")
+        return {"result_hash": result_hash, "result": outputs.get(result_hash)}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error getting output {result_hash}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+# ✅ Статистика хранилища выводов
+@app.get("/ui/get_output_stats")
+async def get_output_stats():
+    try:
+        return outputs.stats()
+    except Exception as e:
+        logger.error(f"Error getting output stats: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 # ✅ Отправка новой команды агенту
 @app.post("/ui/push_task")
 async def push_task(cmd: Command):
     try:
-        if cmd.host not in tasks:
-            tasks[cmd.host] = []
-        tasks[cmd.host].append(cmd.cmd)
-        limit_tasks(cmd.host)  # Ограничиваем количество задач
+        enqueue_task(cmd.host, cmd.cmd)
         logger.info(f"Pushed task to {cmd.host}: {cmd.cmd[:50]}...")
         return {"status": "task added"}
     except Exception as e:
         logger.error(f"Error pushing task to {cmd.host}: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# ✅ Создание задания в планировщике
+@app.post("/ui/add_schedule")
+async def add_schedule(schedule: Schedule):
+    try:
+        return scheduler.add(schedule.model_dump())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error adding schedule: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+# ✅ Список заданий планировщика
+@app.get("/ui/get_schedules")
+async def get_schedules():
+    try:
+        return scheduler.list()
+    except Exception as e:
+        logger.error(f"Error getting schedules: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+# ✅ Удаление задания из планировщика
+@app.delete("/ui/delete_schedule/{job_id}")
+async def delete_schedule(job_id: str):
+    try:
+        if not scheduler.remove(job_id):
+            raise HTTPException(status_code=404, detail=f"Schedule {job_id} not found")
+        logger.info(f"Deleted schedule {job_id}")
+        return {"status": f"deleted {job_id}"}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error deleting schedule {job_id}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+# ✅ Создание правила алертов
+@app.post("/ui/add_alert_rule")
+async def add_alert_rule(rule: AlertRule):
+    try:
+        return alerts.add_rule(rule.model_dump())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error adding alert rule: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+# ✅ Список правил алертов
+@app.get("/ui/get_alert_rules")
+async def get_alert_rules():
+    try:
+        return list(alerts.rules.values())
+    except Exception as e:
+        logger.error(f"Error getting alert rules: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+# ✅ Удаление правила алертов
+@app.delete("/ui/delete_alert_rule/{rule_id}")
+async def delete_alert_rule(rule_id: str):
+    try:
+        if not alerts.remove_rule(rule_id):
+            raise HTTPException(status_code=404, detail=f"Alert rule {rule_id} not found")
+        return {"status": f"deleted {rule_id}"}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error deleting alert rule {rule_id}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+# ✅ Активные алерты
+@app.get("/ui/get_alerts")
+async def get_alerts():
+    try:
+        return sorted(alerts.active.values(), key=lambda a: a["fired_at"], reverse=True)
+    except Exception as e:
+        logger.error(f"Error getting alerts: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+# ✅ История срабатываний и снятий алертов (последние события первыми)
+@app.get("/ui/get_alert_history")
+async def get_alert_history(limit: int = 100):
+    try:
+        if limit < 0:
+            raise HTTPException(status_code=400, detail="limit must be >= 0")
+        return list(alerts.history)[::-1][:limit]
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error getting alert history: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+# ✅ Проверка доставки алертов: отправляет тестовое событие во все webhook
+@app.post("/ui/test_alert_sinks")
+async def test_alert_sinks():
+    try:
+        now = time.time()
+        event = {"id": "test", "rule": "test", "severity": "info", "host": "rms_server",
+                 "key": "test", "message": "RMS test alert", "state": "test", "time": now}
+        for sink in alerts.sinks:
+            sink.send(event)
+        return {"status": f"sent to {len(alerts.sinks)} sinks"}
+    except Exception as e:
+        logger.error(f"Error testing alert sinks: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 # ✅ Очистка истории выполнения команд
 @app.delete("/ui/clear_results/{hostname}")
 async def clear_results(hostname: str):
     try:
+        for record in results.get(hostname, []):
+            outputs.release(record["result_hash"])
         results[hostname] = []
         logger.info(f"Cleared results for {hostname}")
         return {"status": f"cleared for {hostname}"}
@@ -0,0 +1,64 @@
+import hashlib
+import zlib
+from typing import Dict, Tuple
+
+
+class OutputStore:
+    """Хранилище выводов команд с адресацией по содержимому.
+
+    Каждый уникальный вывод хранится один раз под своим SHA-256, при
+    необходимости сжатый zlib, со счётчиком ссылок. Записи результатов
+    хранят только хеш; при вытеснении записи счётчик уменьшается, и
+    тело удаляется, когда на него больше никто не ссылается.
+    """
+
+    def __init__(self, compress_min_size: int = 256, compress_level: int = 6):
+        self.compress_min_size = compress_min_size
+        self.compress_level = compress_level
+        # digest -> (сжато ли, тело)
+        self.blobs: Dict[str, Tuple[bool, bytes]] = {}
+        self.refs: Dict[str, int] = {}
+        self.sizes: Dict[str, int] = {}
+
+    def put(self, text: str) -> str:
+        """Сохраняет вывод (или увеличивает счётчик ссылок) и возвращает его хеш"""
+        raw = text.encode("utf-8")
+        digest = hashlib.sha256(raw).hexdigest()
+        if digest in self.refs:
+            self.refs[digest] += 1
+            return digest
+        if len(raw) >= self.compress_min_size:
+            packed = zlib.compress(raw, self.compress_level)
+            # Несжимаемые выводы храним как есть
+            blob = (True, packed) if len(packed) < len(raw) else (False, raw)
+        else:
+            blob = (False, raw)
+        self.blobs[digest] = blob
+        self.refs[digest] = 1
+        self.sizes[digest] = len(raw)
+        return digest
+
+    def get(self, digest: str) -> str:
+        compressed, data = self.blobs[digest]
+        return (zlib.decompress(data) if compressed else data).decode("utf-8")
+
+    def release(self, digest: str):
+        """Уменьшает счётчик ссылок и удаляет тело, когда ссылок не осталось"""
+        count = self.refs.get(digest, 0) - 1
+        if count > 0:
+            self.refs[digest] = count
+            return
+        self.refs.pop(digest, None)
+        self.blobs.pop(digest, None)
+        self.sizes.pop(digest, None)
+
+    def stats(self) -> Dict:
+        stored = sum(len(data) for _, data in self.blobs.values())
+        logical = sum(self.sizes[d] * n for d, n in self.refs.items())
+        return {
+            "outputs": len(self.blobs),
+            "references": sum(self.refs.values()),
+            "raw_bytes": sum(self.sizes.values()),
+            "stored_bytes": stored,
+            "logical_bytes": logical,
+        }
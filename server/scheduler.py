@@ -0,0 +1,339 @@
+import asyncio
+import heapq
+import itertools
+import json
+import logging
+import math
+import os
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+logger = logging.getLogger("rms_server.scheduler")
+
+SCHEDULE_KINDS = ("interval", "cron", "once")
+
+# Диапазоны полей cron: минута, час, день месяца, месяц, день недели
+CRON_FIELDS = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+
+def _parse_cron_field(field: str, low: int, high: int) -> Set[int]:
+    values = set()
+    for part in field.split(","):
+        step = 1
+        if "/" in part:
+            part, step_str = part.split("/", 1)
+            step = int(step_str)
+            if step < 1:
+                raise ValueError(f"Invalid cron step: {step_str}")
+        if part == "*":
+            start, end = low, high
+        elif "-" in part:
+            start_str, end_str = part.split("-", 1)
+            start, end = int(start_str), int(end_str)
+        else:
+            start = int(part)
+            end = high if step > 1 else start
+        if start < low or end > high or start > end:
+            raise ValueError(f"Cron value out of range {low}-{high}: {field}")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class CronExpr:
+    """Классическое cron-выражение из 5 полей (локальное время сервера)"""
+
+    def __init__(self, expr: str):
+        fields = expr.split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression must have 5 fields: {expr!r}")
+        self.expr = expr
+        self.minutes, self.hours, self.days, self.months, dows = (
+            _parse_cron_field(f, low, high) for f, (low, high) in zip(fields, CRON_FIELDS)
+        )
+        # 0 и 7 - воскресенье
+        self.dows = {d % 7 for d in dows}
+        # Как в cron: поле, начинающееся с "*" (в т.ч. "*/2"), не ограничивает день
+        self.any_day = fields[2].startswith("*")
+        self.any_dow = fields[4].startswith("*")
+
+    def _day_matches(self, dt: datetime) -> bool:
+        day_ok = dt.day in self.days
+        dow_ok = (dt.weekday() + 1) % 7 in self.dows
+        # Как в cron: если заданы оба поля, достаточно совпадения любого из них
+        if self.any_day or self.any_dow:
+            return day_ok and dow_ok
+        return day_ok or dow_ok
+
+    def next_after(self, ts: float) -> float:
+        """Ближайшее время срабатывания строго после ts"""
+        # Шаги по минутам делаем в абсолютном времени: fromtimestamp выставляет fold,
+        # и в повторяющийся час перевода часов назад каждая минута проходится дважды
+        dt = datetime.fromtimestamp(datetime.fromtimestamp(ts).replace(second=0, microsecond=0).timestamp() + 60)
+        limit = dt + timedelta(days=366 * 5)
+        while dt < limit:
+            if dt.month not in self.months:
+                dt = (dt.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._day_matches(dt):
+                dt = dt.replace(hour=0, minute=0) + timedelta(days=1)
+            elif dt.hour not in self.hours:
+                dt = dt.replace(minute=0) + timedelta(hours=1)
+            elif dt.minute not in self.minutes:
+                dt = datetime.fromtimestamp(dt.timestamp() + 60)
+            else:
+                # После пропуска часов/дней fold сброшен, а одно и то же локальное время
+                # может встречаться дважды - берём первое вхождение, которое позже ts
+                for fold in (dt.fold, 1):
+                    candidate = dt.replace(fold=fold).timestamp()
+                    if candidate > ts:
+                        return candidate
+                dt = datetime.fromtimestamp(dt.replace(fold=1).timestamp() + 60)
+        raise ValueError(f"Cron expression never fires: {self.expr!r}")
+
+
+class Scheduler:
+    """Планировщик повторяющихся и отложенных задач на одной куче таймеров.
+
+    В куче лежат два вида записей: срабатывание задания ("job") и очередная
+    порция рассылки ("fanout"). Большая рассылка хранится в самом задании
+    (список хостов, шаг и номер следующего хоста) и растягивается во времени
+    одной записью в куче, которая переставляется после каждой порции.
+    Задания вместе с незавершёнными рассылками сохраняются в JSON-файл и
+    восстанавливаются при старте; прогресс рассылки сохраняется не чаще раза
+    в save_interval секунд, поэтому после перезапуска хосты за последний
+    такой интервал могут получить команду повторно. Удаление задания
+    отменяет и его незавершённые рассылки.
+    """
+
+    def __init__(self, enqueue: Callable[[str, str], None],
+                 resolve_hosts: Callable[[Dict], List[str]],
+                 state_file: os.PathLike, hosts_per_second: float = 100.0,
+                 max_spread: float = 300.0, save_interval: float = 1.0):
+        self.enqueue = enqueue
+        self.resolve_hosts = resolve_hosts
+        self.state_file = state_file
+        self.hosts_per_second = hosts_per_second
+        self.max_spread = max_spread
+        self.save_interval = save_interval
+        self._last_save = 0.0
+        self.jobs: Dict[str, Dict] = {}
+        self._heap: List = []
+        self._seq = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+
+    # 🧮 Расчёт времени
+
+    @staticmethod
+    def _next_run(job: Dict, after: float) -> Optional[float]:
+        if job["kind"] == "interval":
+            # Держим исходную сетку, пропуская пропущенные интервалы
+            nxt = job.get("next_run") or after
+            if nxt <= after:
+                nxt += (math.floor((after - nxt) / job["every"]) + 1) * job["every"]
+            return nxt
+        if job["kind"] == "cron":
+            return CronExpr(job["cron"]).next_after(after)
+        return None
+
+    def _validate(self, spec: Dict) -> Dict:
+        kind = spec.get("kind")
+        if kind not in SCHEDULE_KINDS:
+            raise ValueError(f"kind must be one of {SCHEDULE_KINDS}")
+        if not spec.get("cmd"):
+            raise ValueError("cmd is required")
+        if not spec.get("hosts") and not spec.get("selector"):
+            raise ValueError("hosts or selector is required")
+        job = {
+            "cmd": spec["cmd"],
+            "hosts": list(spec.get("hosts") or []),
+            "selector": spec.get("selector"),
+            "online_only": spec.get("online_only", True),
+            "kind": kind,
+            "spread": spec.get("spread"),
+        }
+        now = time.time()
+        if kind == "interval":
+            if not spec.get("every") or spec["every"] <= 0:
+                raise ValueError("every must be a positive number of seconds")
+            job["every"] = spec["every"]
+            job["next_run"] = now + spec["every"]
+        elif kind == "cron":
+            job["cron"] = spec.get("cron") or ""
+            job["next_run"] = CronExpr(job["cron"]).next_after(now)
+        else:
+            if spec.get("run_at") is not None:
+                job["next_run"] = spec["run_at"]
+            elif spec.get("delay") is not None:
+                job["next_run"] = now + spec["delay"]
+            else:
+                raise ValueError("run_at or delay is required for kind=once")
+        return job
+
+    # 📋 Управление заданиями
+
+    def _push(self, when: float, kind: str, payload):
+        heapq.heappush(self._heap, (when, next(self._seq), kind, payload))
+        if self._wakeup is not None and self._heap[0][0] == when:
+            self._wakeup.set()
+
+    def add(self, spec: Dict) -> Dict:
+        job = self._validate(spec)
+        job["id"] = uuid.uuid4().hex[:12]
+        job["created"] = time.time()
+        job["last_run"] = None
+        job["fanouts"] = []
+        self.jobs[job["id"]] = job
+        self._push(job["next_run"], "job", (job["id"], job["next_run"]))
+        self.save()
+        logger.info(f"Scheduled {job['kind']} job {job['id']}: {job['cmd'][:50]}")
+        return job
+
+    def remove(self, job_id: str) -> bool:
+        # Записи в куче (и задания, и его рассылок) остаются и будут пропущены при извлечении
+        if self.jobs.pop(job_id, None) is None:
+            return False
+        self.save()
+        logger.info(f"Removed scheduled job {job_id}")
+        return True
+
+    def list(self) -> List[Dict]:
+        # У отработавшего разового задания с незавершённой рассылкой next_run = None
+        return sorted(self.jobs.values(), key=lambda j: j["next_run"] or float("inf"))
+
+    # 💾 Сохранение состояния
+
+    def save(self):
+        tmp = f"{self.state_file}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"jobs": list(self.jobs.values())}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.state_file)
+        self._last_save = time.time()
+
+    def load(self):
+        if not os.path.exists(self.state_file):
+            return
+        try:
+            with open(self.state_file, encoding="utf-8") as f:
+                jobs = json.load(f).get("jobs", [])
+        except (OSError, ValueError) as e:
+            logger.error(f"Error loading scheduler state from {self.state_file}: {e}")
+            return
+        now = time.time()
+        for job in jobs:
+            job.setdefault("fanouts", [])
+            if job["next_run"] is None and not job["fanouts"]:
+                continue
+            # Пропущенные за время простоя запуски повторяющихся заданий не догоняем
+            if job["kind"] != "once" and job["next_run"] <= now:
+                job["next_run"] = self._next_run(job, now)
+            self.jobs[job["id"]] = job
+            if job["next_run"] is not None:
+                self._push(job["next_run"], "job", (job["id"], job["next_run"]))
+            for fanout in job["fanouts"]:
+                # Недоставленный остаток рассылки продолжаем растягивать с текущего момента
+                fanout["start"] = now - fanout["next"] * fanout["step"]
+                self._push(now, "fanout", (job["id"], fanout["id"]))
+        logger.info(f"Loaded {len(self.jobs)} scheduled jobs")
+
+    # ⏱️ Основной цикл
+
+    def _spread_window(self, job: Dict, count: int) -> float:
+        if job.get("spread") is not None:
+            return job["spread"]
+        return min(self.max_spread, count / self.hosts_per_second)
+
+    def _deliver(self, hosts: Iterable[str], cmd: str):
+        for host in hosts:
+            try:
+                self.enqueue(host, cmd)
+            except Exception as e:
+                logger.error(f"Error delivering scheduled task to {host}: {e}")
+
+    def _finish(self, job: Dict):
+        """Удаляет отработавшее разовое задание, когда его рассылки завершены"""
+        if job["next_run"] is None and not job["fanouts"]:
+            self.jobs.pop(job["id"], None)
+
+    def _fire(self, job: Dict, now: float):
+        # Сначала перепланируем задание, чтобы ошибка рассылки его не потеряла
+        job["last_run"] = now
+        job["next_run"] = self._next_run(job, now)
+        if job["next_run"] is not None and job["next_run"] <= now:
+            # Защита от зацикливания _run_due: никогда не ставим запуск в прошлое
+            logger.error(f"Job {job['id']} got next_run in the past, postponing by 60s")
+            job["next_run"] = now + 60
+        if job["next_run"] is not None:
+            self._push(job["next_run"], "job", (job["id"], job["next_run"]))
+
+        try:
+            hosts = self.resolve_hosts(job)
+            window = self._spread_window(job, len(hosts))
+            if window <= 0 or len(hosts) <= 1:
+                self._deliver(hosts, job["cmd"])
+            else:
+                # Равномерно раскладываем хосты по окну, первый получает задачу сразу
+                fanout = {
+                    "id": uuid.uuid4().hex[:8],
+                    "hosts": hosts,
+                    "start": now,
+                    "step": window / len(hosts),
+                    "next": 0,
+                }
+                job["fanouts"].append(fanout)
+                self._push(now, "fanout", (job["id"], fanout["id"]))
+            logger.info(f"Fired job {job['id']} for {len(hosts)} hosts over {window:.1f}s")
+        finally:
+            self._finish(job)
+            self.save()
+
+    def _run_fanout(self, job: Dict, fanout_id: str, now: float):
+        """Доставляет хосты рассылки, время которых наступило, и переставляет её в куче"""
+        fanout = next((f for f in job["fanouts"] if f["id"] == fanout_id), None)
+        if fanout is None:
+            return
+        hosts, step = fanout["hosts"], fanout["step"]
+        # Запись извлечена по наступлении её времени - хотя бы следующий хост уже должен получить задачу
+        due = min(len(hosts), max(math.floor((now - fanout["start"]) / step) + 1, fanout["next"] + 1))
+        self._deliver(hosts[fanout["next"]:due], job["cmd"])
+        fanout["next"] = max(fanout["next"], due)
+        if fanout["next"] >= len(hosts):
+            job["fanouts"].remove(fanout)
+            self._finish(job)
+            self.save()
+            return
+        self._push(fanout["start"] + fanout["next"] * step, "fanout", (job["id"], fanout_id))
+        if now - self._last_save >= self.save_interval:
+            self.save()
+
+    def _run_due(self):
+        now = time.time()
+        while self._heap and self._heap[0][0] <= now:
+            when, _, kind, payload = heapq.heappop(self._heap)
+            job_id = payload[0]
+            job = self.jobs.get(job_id)
+            # Задание удалено - пропускаем и его запуски, и его рассылки
+            if job is None:
+                continue
+            try:
+                if kind == "fanout":
+                    self._run_fanout(job, payload[1], now)
+                # Устаревшая запись: задание перепланировано
+                elif job["next_run"] == payload[1]:
+                    self._fire(job, now)
+            except Exception as e:
+                logger.error(f"Error running scheduled job {job_id}: {e}")
+
+    async def run(self):
+        self._wakeup = asyncio.Event()
+        while True:
+            try:
+                self._run_due()
+            except Exception as e:
+                logger.error(f"Error in scheduler loop: {e}")
+            timeout = self._heap[0][0] - time.time() if self._heap else None
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
@@ -91,6 +91,36 @@ with st.sidebar:
             format_func=lambda x: f"{x} {'🟢' if clients[x]['online'] else '🔴'}"
         )
 
+# Статистика по всему парку
+with st.expander("📈 Статистика парка"):
+    try:
+        fleet_response = requests.get(f"{SERVER_URL}/ui/fleet_stats", timeout=AGENT_TIMEOUT)
+        fleet_response.raise_for_status()
+        fleet = fleet_response.json()
+    except Exception as e:
+        st.error(f"Ошибка получения статистики парка: {e}")
+        fleet = None
+
+    if fleet and fleet["hosts"]:
+        st.dataframe(
+            [
+                {"Метрика": label, **fleet[key]["percentiles"], "Среднее": fleet[key]["mean"]}
+                for key, label in (("cpu", "CPU"), ("memory", "RAM"), ("disk", "Диски"))
+                if fleet[key]["count"]
+            ],
+            use_container_width=True
+        )
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.subheader("Top CPU")
+            st.dataframe(fleet["top_cpu"], use_container_width=True)
+        with col2:
+            st.subheader("Top RAM")
+            st.dataframe(fleet["top_memory"], use_container_width=True)
+        with col3:
+            st.subheader(f"Диски > {fleet['disk_threshold']}%")
+            st.dataframe(fleet["disks_over_threshold"], use_container_width=True)
+
 # Основной контент
 if selected_host:
     # Информация о системе
@@ -108,6 +138,30 @@ if selected_host:
     for disk, usage in clients[selected_host]['disks'].items():
         st.progress(usage/100, text=f"{disk}: {usage}%")
     
+    # Top процессов (если на агенте включён AGENT_PROCESS_SAMPLING)
+    try:
+        processes_response = requests.get(f"{SERVER_URL}/ui/get_processes/{selected_host}", timeout=AGENT_TIMEOUT)
+        processes_response.raise_for_status()
+        process_table = processes_response.json()
+    except Exception as e:
+        st.error(f"Ошибка получения списка процессов: {e}")
+        process_table = {"processes": []}
+    
+    if process_table["processes"]:
+        st.subheader("🔥 Top процессов")
+        st.dataframe(
+            [
+                {
+                    "PID": p["pid"],
+                    "Имя": p["name"],
+                    "CPU, %": p["cpu"],
+                    "RSS, МБ": round(p["rss"] / 1024 / 1024, 1)
+                }
+                for p in process_table["processes"]
+            ],
+            use_container_width=True
+        )
+    
     # Управление службами
     st.header("⚙️ Управление службами")
     